@@ -2,23 +2,36 @@ from __future__ import annotations
 
 import argparse
 import functools
+import itertools
+import mmap
 import os
 import pathlib
 import re
 import subprocess
 import sys
 import tomllib
-from collections import ChainMap
-from collections.abc import Callable, Generator, Sequence
+from collections.abc import Callable, Generator, Iterable, Sequence
 from functools import cached_property
-from multiprocessing import Pool
-from typing import Any
+from multiprocessing import get_context
+from multiprocessing.pool import Pool as PoolType
+from re import _parser  # type: ignore[attr-defined]
+from stat import S_ISREG
+from typing import TYPE_CHECKING, Any, BinaryIO
 
-import pygments.lexers
 from identify import identify
-from pygments import highlight
-from pygments.formatters import TerminalTrueColorFormatter
-from pygments.lexers import TextLexer
+
+if TYPE_CHECKING:
+    from pygments.lexer import Lexer
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+try:
+    import rtoml
+except ImportError:
+    rtoml = None  # type: ignore[assignment]
 
 err = functools.partial(print, file=sys.stderr)
 out = functools.partial(print, file=sys.stderr)
@@ -46,13 +59,12 @@ def main() -> int:
         "--version", action="version", version=f"egret {__version__}"
     )
 
-    parser = argparse.ArgumentParser(prog="egret", parents=[config_parser])
     args, _ = config_parser.parse_known_args()
 
-    defaults = ChainMap(
-        parse_config_toml(args.config),
-        parse_config_toml(find_user_config_file()),
-        DEFAULTS,
+    defaults = (
+        DEFAULTS
+        | parse_config_toml(find_user_config_file())
+        | parse_config_toml(args.config)
     )
 
     parser = argparse.ArgumentParser(prog="egret", parents=[config_parser])
@@ -98,7 +110,12 @@ def main() -> int:
     group.add_argument(
         "--color",
         choices=("always", "auto", "never"),
-        help="When to use syntax highlighting on the matched text.",
+        help="When to highlight the matched text.",
+    )
+    group.add_argument(
+        "--highlight-syntax",
+        action="store_true",
+        help="Syntax highlight selected lines rather than only the matched text.",
     )
 
     group = parser.add_argument_group(
@@ -167,10 +184,33 @@ def main() -> int:
 
     max_count = 1 if args.files_with_matches else -1
 
-    if args.color == "always" or (args.color == "auto" and sys.stdout.isatty()):
-        Formatter: type[SelectionFormatter] = SelectionFormatterSyntaxHighlight
+    color = args.color == "always" or (
+        args.color == "auto" and sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+    )
+    try:
+        selector = LineSelector(
+            args.pattern,
+            max_count=max_count,
+            invert_match=args.invert_match,
+            ignore_case=args.ignore_case,
+        )
+    except re.error as error:
+        err(f"invalid pattern: {error}")
+        return 1
+
+    formatter_kwds = {
+        "with_line_numbers": args.line_number,
+        "files_with_matches": args.files_with_matches,
+    }
+    formatter: SelectionFormatter
+    if color and args.highlight_syntax:
+        formatter = SelectionFormatterSyntaxHighlight(**formatter_kwds)
+    elif color and not args.invert_match:
+        formatter = SelectionFormatterMatchHighlight(
+            args.pattern, ignore_case=args.ignore_case, **formatter_kwds
+        )
     else:
-        Formatter = SelectionFormatter
+        formatter = SelectionFormatter(**formatter_kwds)
 
     if args.walk:
         FileCollector: type[CollectFiles] = WalkFiles
@@ -178,125 +218,542 @@ def main() -> int:
         FileCollector = GitFiles
 
     process_files = ProcessFiles(
-        LineSelector(
-            args.pattern, max_count=max_count, invert_match=args.invert_match
-        ).select_from_path,
-        Formatter(
-            with_line_numbers=args.line_number,
-            files_with_matches=args.files_with_matches,
-        ).format,
+        selector.select_from_path,
+        formatter.format,
         workers=args.jobs,
+        preload=formatter.PRELOAD,
     )
 
-    matches: list[str] = []
-    for dir_ in args.dir:
-        files = FileCollector(
-            base=dir_,
-            include=args.include,
-            exclude=args.exclude,
-            types=args.types + args.extend_types,
-            types_or=args.types_or + args.extend_types_or,
-        )
-        matches += process_files(files.collect())
-
     files_matched = 0
-    for match in matches:
-        files_matched += 1
-        try:
-            print(match)
-        except BrokenPipeError:
-            devnull = os.open(os.devnull, os.O_WRONLY)
-            os.dup2(devnull, sys.stdout.fileno())
-            break
+    write = sys.stdout.buffer.write
+    newline = os.linesep.encode()
+    try:
+        with process_files:
+            for dir_ in args.dir:
+                collector = FileCollector(
+                    base=dir_,
+                    include=args.include,
+                    exclude=args.exclude,
+                    types=args.types + args.extend_types,
+                    types_or=args.types_or + args.extend_types_or,
+                )
+                for match in process_files(collector.collect()):
+                    files_matched += 1
+                    write(match)
+                    write(newline)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
 
     return 0 if files_matched else 1
 
 
 def find_user_config_file() -> str:
+    return _find_user_config_file(
+        os.environ.get("XDG_CONFIG_HOME"), os.path.expanduser("~")
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _find_user_config_file(config_home: str | None, home: str) -> str:
     if sys.platform == "win32":
-        user_config_path = pathlib.Path.home() / ".egret.toml"
+        user_config_path = pathlib.Path(home) / ".egret.toml"
     else:
-        config_root = os.environ.get("XDG_CONFIG_HOME", "~/.config")
+        config_root = (
+            os.path.join(home, ".config") if config_home is None else config_home
+        )
         user_config_path = pathlib.Path(config_root).expanduser() / "egret.toml"
     return str(user_config_path.resolve())
 
 
 def parse_config_toml(path_to_config: str | None) -> dict[str, Any]:
-    if path_to_config is not None and pathlib.Path(path_to_config).is_file():
-        with open(path_to_config, "rb") as fp:
-            config_toml = tomllib.load(fp)
-        config: dict[str, Any] = config_toml.get("tool", {}).get("egret", {})
-        config = {k.replace("--", "").replace("-", "_"): v for k, v in config.items()}
-    else:
-        config = {}
+    if path_to_config is None:
+        return {}
+    try:
+        stat = os.stat(path_to_config)
+    except (OSError, ValueError):
+        return {}
+    if not S_ISREG(stat.st_mode):
+        return {}
+
+    return dict(
+        _load_config_toml(
+            os.path.abspath(path_to_config), stat.st_mtime_ns, stat.st_size
+        )
+    )
 
-    return config
+
+_DASH_TO_UNDERSCORE = str.maketrans("-", "_")
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_toml(path_to_config: str, mtime_ns: int, size: int) -> dict[str, Any]:
+    with open(path_to_config, "rb") as fp:
+        if rtoml is None:
+            config_toml = tomllib.load(fp)
+        else:
+            config_toml = rtoml.loads(fp.read().decode())
+    config: dict[str, Any] = config_toml.get("tool", {}).get("egret", {})
+    return {k.lstrip("-").translate(_DASH_TO_UNDERSCORE): v for k, v in config.items()}
 
 
 class ProcessFiles:
+    SERIAL_THRESHOLD = 32
+    CHUNKSIZE = 16
+
     def __init__(
         self,
         select_lines: Callable[[str], list[tuple[int, str]]],
         format_selection: Callable[[str, list[tuple[int, str]]], str],
         workers: int | None = None,
+        preload: Sequence[str] = (),
     ) -> None:
         self._select_lines = select_lines
         self._format_selection = format_selection
         self._workers = workers or os.cpu_count() or 1
+        self._preload = [__name__, *preload]
+        self._pool: PoolType | None = None
+        self._in_context = False
+
+    def __enter__(self) -> ProcessFiles:
+        self._in_context = True
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._in_context = False
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    @property
+    def pool(self) -> PoolType:
+        if self._pool is None:
+            context = get_context()
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload(self._preload)
+            self._pool = context.Pool(
+                processes=self._workers, initializer=_init_worker, initargs=(self,)
+            )
+        return self._pool
+
+    def __getstate__(self) -> dict[str, Any]:
+        return self.__dict__ | {"_pool": None}
 
-    def one(self, filename: str) -> str:
-        if selected_lines := self._select_lines(filename):
+    def one(self, filename: str) -> bytes:
+        try:
+            selected_lines = self._select_lines(filename)
+        except OSError as error:
+            sys.stderr.write(
+                f"unable to process {filename}: {error.strerror or error}\n"
+            )
+            return b""
+
+        if selected_lines:
             formatted_lines = self._format_selection(filename, selected_lines)
-            return formatted_lines
-        return ""
+            return formatted_lines.encode(errors="surrogateescape")
+        return b""
+
+    def __call__(self, files: Iterable[str]) -> Generator[bytes, None, None]:
+        files = iter(files)
+        head = list(itertools.islice(files, self.SERIAL_THRESHOLD))
+        paths = itertools.chain(head, files)
+
+        results: Iterable[bytes]
+        if self._workers == 1 or len(head) < self.SERIAL_THRESHOLD:
+            results = map(self.one, paths)
+        elif not self._in_context:
+            with self:
+                yield from self(paths)
+            return
+        else:
+            results = self.pool.imap(_process_one, paths, chunksize=self.CHUNKSIZE)
+        yield from (formatted for formatted in results if formatted)
+
+
+_worker: dict[str, Callable[[str], bytes]] = {}
+
+
+def _init_worker(process_files: ProcessFiles) -> None:
+    _worker["one"] = process_files.one
+
 
-    def __call__(
-        self, files: Sequence[str] | Generator[str, None, None]
-    ) -> Generator[str, None, None]:
-        with Pool(processes=self._workers) as pool:
-            formatted_lines = pool.map(self.one, files)
-        return (line for line in formatted_lines if line)
+def _process_one(filename: str) -> bytes:
+    return _worker["one"](filename)
 
 
 class LineSelector:
+    MMAP_THRESHOLD = 64 * 1024
+
     def __init__(
-        self, pattern: str, max_count: int = -1, invert_match: bool = False
+        self,
+        pattern: str,
+        max_count: int = -1,
+        invert_match: bool = False,
+        ignore_case: bool = False,
+        buffer_size: int = 1 << 20,
     ) -> None:
-        self._pattern = re.compile(pattern)
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        text_pattern = re.compile(pattern, flags)
+        self._text_pattern: re.Pattern[str] | None = text_pattern
+        self._pattern = _NO_MATCH
+        if _can_search_bytes(text_pattern):
+            try:
+                self._pattern = re.compile(pattern.encode(), flags)
+            except re.error:
+                pass
+            else:
+                self._text_pattern = None
+        self._regex = _compile_re2(self._pattern) or self._pattern
+        self._folded_regex = None
+        if ignore_case and pattern.isascii() and re.escape(pattern) == pattern:
+            # searching a lowercased copy beats case-insensitive matching
+            folded = re.compile(pattern.lower().encode(), re.MULTILINE)
+            self._folded_regex = _compile_re2(folded) or folded
+        self._end_anchored = b"$" in self._pattern.pattern
         self._max_count = max_count
         self._invert_match = invert_match
+        self._buffer_size = buffer_size
+        # the regex engine already scans ahead for a literal prefix of a bytes
+        # pattern, but text patterns are only searched one decoded line at a time
+        self._required = _required_literal(
+            text_pattern, skip_prefix=self._text_pattern is None
+        )
+
+    @staticmethod
+    def cache_clear() -> None:
+        _compile_re2.cache_clear()
 
     def select_from_path(self, filename: str) -> list[tuple[int, str]]:
-        with open(filename) as fp:
-            return self.select_from_filelike(fp)
-
-    def select_from_filelike(self, filelike) -> list[tuple[int, str]]:
-        count = 0
-        selected = []
-        for lineno, line in enumerate(filelike):
-            if self.match_line(line):
-                selected.append((lineno, line.rstrip(os.linesep)))
-                count += 1
-                if count == self._max_count:
-                    break
-        return selected
+        with open(filename, "rb", buffering=0) as fp:
+            if os.fstat(fp.fileno()).st_size < LineSelector.MMAP_THRESHOLD:
+                return self.select_from_buffer(fp.read())
+
+            with _MappedFile(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    buffer.madvise(mmap.MADV_SEQUENTIAL)
+                return self.select_from_buffer(buffer)
+
+    def select_from_filelike(self, filelike: BinaryIO) -> list[tuple[int, str]]:
+        selected: list[tuple[int, str]] = []
+        lineno, remainder = 0, b""
+        while chunk := filelike.read(self._buffer_size):
+            buffer = remainder + chunk
+            if (stop := buffer.rfind(b"\n") + 1) == 0:
+                remainder = buffer
+                continue
+            buffer, remainder = buffer[:stop], buffer[stop:]
+
+            selected += [
+                (lineno + offset, line)
+                for offset, line in self.select_from_buffer(buffer)
+            ]
+            if 0 < self._max_count <= len(selected):
+                return selected[: self._max_count]
+            lineno += buffer.count(b"\n")
+
+        if remainder:
+            selected += [
+                (lineno + offset, line)
+                for offset, line in self.select_from_buffer(remainder)
+            ]
+        return selected[: self._max_count] if self._max_count > 0 else selected
 
-    def match_line(self, line: str) -> bool:
+    def select_from_buffer(self, buffer: bytes | _MappedFile) -> list[tuple[int, str]]:
         if self._invert_match:
-            return not self._pattern.search(line)
+            return self._select_unmatched(buffer)
+        else:
+            return self._select_matched(buffer)
+
+    def _select_matched(self, buffer: bytes | _MappedFile) -> list[tuple[int, str]]:
+        selected: list[tuple[int, str]] = []
+        for lineno, start, stop in self._matched_lines(buffer):
+            stop = _line_end(buffer, start, stop)
+            selected.append((lineno, buffer[start:stop].decode(errors="replace")))
+            if len(selected) == self._max_count:
+                break
+        return selected
+
+    def _select_unmatched(self, buffer: bytes | _MappedFile) -> list[tuple[int, str]]:
+        end = len(buffer)
+        limit = self._max_count if self._max_count > 0 else end + 1
+
+        selected: list[tuple[int, str]] = []
+        lineno, pos = 0, 0
+        for matched_lineno, start, stop in self._matched_lines(buffer):
+            if matched_lineno == lineno + 1:
+                selected.append((lineno, _decode_line(buffer[pos : start - 1])))
+            elif start > pos:
+                selected += _split_lines(
+                    buffer[pos : start - 1], lineno, limit - len(selected)
+                )
+            if len(selected) >= limit:
+                return selected[:limit]
+            lineno, pos = matched_lineno + 1, stop + 1
+
+        if pos < end:
+            stop = end - 1 if buffer.endswith(b"\n") else end
+            selected += _split_lines(buffer[pos:stop], lineno, limit - len(selected))
+        return selected
+
+    def _matched_lines(
+        self, buffer: bytes | _MappedFile
+    ) -> Generator[tuple[int, int, int], None, None]:
+        if self._text_pattern is not None:
+            text_search = self._text_pattern.search
+
+            def search_line(start: int, stop: int) -> Any:
+                return text_search(buffer[start:stop].decode(errors="replace"))
+
+            yield from self._matched_each_line(buffer, search_line)
+            return
+
+        search, haystack = self._regex.search, buffer
+        if self._folded_regex is not None and isinstance(buffer, bytes):
+            search, haystack = self._folded_regex.search, buffer.lower()
+        if self._end_anchored and (buffer.find(b"\r\n") >= 0 or buffer.endswith(b"\r")):
+            # $ only matches before a \n, so search each line without its \r.
+            # re2 looks past endpos for the \n, so this needs re.
+            yield from self._matched_each_line(
+                buffer, functools.partial(self._pattern.search, buffer)
+            )
+            return
+
+        find, rfind, count = buffer.find, buffer.rfind, buffer.count
+        end = len(buffer)
+        has_last_line = not buffer.endswith(b"\n")
+
+        required = self._required
+        lineno, pos = 0, 0
+        while pos < end:
+            if required:
+                # only a line holding the required literal can match
+                if (hit := find(required, pos)) < 0:
+                    break
+                start = rfind(b"\n", pos, hit) + 1 or pos
+                if (stop := find(b"\n", hit)) < 0:
+                    stop = end
+                line_end = _line_end(buffer, start, stop)
+                if (match := search(haystack, start, line_end)) is None:
+                    lineno += count(b"\n", pos, stop) + 1
+                    pos = stop + 1
+                    continue
+            elif (match := search(haystack, pos)) is None:
+                break
+
+            match_start = match.start()
+            if match_start == end and not has_last_line:
+                break
+            start = rfind(b"\n", pos, match_start) + 1 or pos
+            if (stop := find(b"\n", match_start)) < 0:
+                stop = end
+            if start > pos:
+                lineno += count(b"\n", pos, start)
+
+            line_end = _line_end(buffer, start, stop)
+            if match.end() <= line_end or search(haystack, start, line_end):
+                yield lineno, start, stop
+
+            pos = stop + 1
+            lineno += 1
+
+    def _matched_each_line(
+        self, buffer: bytes | _MappedFile, search: Callable[[int, int], Any]
+    ) -> Generator[tuple[int, int, int], None, None]:
+        find, rfind, count = buffer.find, buffer.rfind, buffer.count
+        end = len(buffer)
+
+        required = self._required
+        lineno, pos = 0, 0
+        while pos < end:
+            if required:
+                if (hit := find(required, pos)) < 0:
+                    break
+                start = rfind(b"\n", pos, hit) + 1 or pos
+                lineno += count(b"\n", pos, start)
+                pos = start
+            if (stop := find(b"\n", pos)) < 0:
+                stop = end
+            if search(pos, _line_end(buffer, pos, stop)):
+                yield lineno, pos, stop
+            pos = stop + 1
+            lineno += 1
+
+    def match_line(self, line: bytes) -> bool:
+        if self._text_pattern is not None:
+            matched = self._text_pattern.search(line.decode(errors="replace"))
+            return (matched is None) is self._invert_match
+        return (self._regex.search(line) is None) is self._invert_match
+
+
+class _MappedFile(mmap.mmap):
+    CHUNK_SIZE = 1 << 20
+
+    def count(self, byte: bytes, start: int = 0, stop: int | None = None) -> int:
+        # counts a single byte in bounded slices so a count never copies the file
+        stop = len(self) if stop is None else stop
+        if stop - start <= self.CHUNK_SIZE:
+            return self[start:stop].count(byte)
+        return sum(
+            self[offset : min(offset + self.CHUNK_SIZE, stop)].count(byte)
+            for offset in range(start, stop, self.CHUNK_SIZE)
+        )
+
+    def endswith(self, suffix: bytes) -> bool:
+        return len(self) >= len(suffix) and self[len(self) - len(suffix) :] == suffix
+
+
+# stands in for the bytes pattern of a selector that matches decoded text
+_NO_MATCH = re.compile(b"(?!)")
+
+
+def _can_search_bytes(pattern: re.Pattern[str]) -> bool:
+    parsed = _parser.parse(pattern.pattern, pattern.flags)
+    return _can_search_items(parsed, bool(parsed.state.flags & re.ASCII), top=True)
+
+
+def _can_search_items(items: Any, ascii: bool, top: bool = False) -> bool:
+    # true if searching a UTF-8 buffer finds the same lines as searching each
+    # decoded line
+    after_run = False
+    for op, av in items:
+        if op is _parser.LITERAL:
+            if av > 127:
+                return False
+            after_run = False
+        elif op is _parser.IN:
+            after_run = False
+            for item_op, item_av in av:
+                if item_op is _parser.LITERAL and item_av < 128:
+                    continue
+                if item_op is _parser.RANGE and item_av[1] < 128:
+                    continue
+                if item_op is _parser.CATEGORY and ascii:
+                    continue
+                return False
+        elif op is _parser.AT:
+            if av in (_parser.AT_BEGINNING_STRING, _parser.AT_END_STRING):
+                # \A and \Z anchor to the line, not to the buffer
+                return False
+            if not ascii and av in (_parser.AT_BOUNDARY, _parser.AT_NON_BOUNDARY):
+                return False
+        elif op is _parser.SUBPATTERN:
+            if not _can_search_items(av[3], ascii or bool(av[1] & re.ASCII)):
+                return False
+        elif op in (
+            _parser.MAX_REPEAT,
+            _parser.MIN_REPEAT,
+            _parser.POSSESSIVE_REPEAT,
+        ):
+            if av[1] == _parser.MAXREPEAT and _is_any_char(av[2]):
+                # a run of characters other than some ASCII ones is a run of
+                # such bytes, and a run of one or more characters is a run of
+                # one or more bytes. The last holds only while two such runs
+                # can't meet: ".+.+" matches the two bytes of "é".
+                if av[0] == 0:
+                    continue
+                if av[0] == 1 and top and not after_run:
+                    after_run = True
+                    continue
+            if not _can_search_items(av[2], ascii):
+                return False
+        elif op in (_parser.ASSERT, _parser.ASSERT_NOT):
+            if not _can_search_items(av[1], ascii):
+                return False
+        elif op is _parser.BRANCH:
+            if not all(_can_search_items(branch, ascii) for branch in av[1]):
+                return False
+        elif op is _parser.GROUPREF_EXISTS:
+            if not all(_can_search_items(branch, ascii) for branch in av[1:] if branch):
+                return False
+        elif op is _parser.ATOMIC_GROUP:
+            if not _can_search_items(av, ascii):
+                return False
+        elif op is not _parser.GROUPREF:
+            return False
+    return True
+
+
+def _is_any_char(items: Any) -> bool:
+    if len(items) != 1:
+        return False
+    op, av = items[0]
+    if op is _parser.ANY:
+        return True
+    if op is _parser.NOT_LITERAL:
+        return av < 128
+    return (
+        op is _parser.IN
+        and av[0][0] is _parser.NEGATE
+        and _can_search_items([(_parser.IN, av[1:])], ascii=False)
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _required_literal(pattern: re.Pattern[str], skip_prefix: bool = False) -> bytes:
+    if pattern.flags & re.IGNORECASE:
+        return b""
+
+    items = list(_flatten_groups(_parser.parse(pattern.pattern, pattern.flags)))
+    if not items or skip_prefix and items[0][0] is _parser.LITERAL:
+        return b""
+
+    longest, run = "", ""
+    for op, av in items:
+        # U+FFFD can also stand for bytes that aren't valid UTF-8
+        if op is _parser.LITERAL and chr(av) not in "\n\ufffd":
+            run += chr(av)
+        else:
+            longest, run = max(longest, run, key=len), ""
+    return max(longest, run, key=len).encode()
+
+
+def _flatten_groups(items: Any) -> Generator[tuple[Any, Any], None, None]:
+    for op, av in items:
+        if op is _parser.SUBPATTERN and not av[1] and not av[2]:
+            yield from _flatten_groups(av[3])
         else:
-            return bool(self._pattern.search(line))
+            yield op, av
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_re2(pattern: re.Pattern[bytes]) -> Any:
+    # re2 reads {,n} as literal text and [:alpha:] as a class
+    if re2 is None or b"{," in pattern.pattern or b"[:" in pattern.pattern:
+        return None
+
+    options = re2.Options()
+    options.encoding = re2.Options.Encoding.LATIN1
+    options.log_errors = False
+    options.case_sensitive = not pattern.flags & re.IGNORECASE
+    try:
+        return re2.compile(b"(?m)" + pattern.pattern, options)
+    except re2.error:
+        return None
+
+
+def _line_end(buffer: bytes | _MappedFile, start: int, stop: int) -> int:
+    # the \r of a \r\n is part of the line ending, not of the line
+    return stop - 1 if stop > start and buffer[stop - 1] == 13 else stop
+
+
+def _split_lines(buffer: bytes, lineno: int, max_lines: int) -> list[tuple[int, str]]:
+    lines = buffer.split(b"\n", max_lines)[:max_lines]
+    return [(lineno + offset, _decode_line(line)) for offset, line in enumerate(lines)]
+
+
+def _decode_line(line: bytes) -> str:
+    return (line[:-1] if line.endswith(b"\r") else line).decode(errors="replace")
 
 
 class SelectionFormatter:
+    PRELOAD: tuple[str, ...] = ()
+
     def __init__(
         self, with_line_numbers: bool = True, files_with_matches: bool = False
     ) -> None:
         self._with_line_numbers = with_line_numbers
         self._files_with_matches = files_with_matches
-        self._ignore_tags = frozenset(
-            identify.TYPE_TAGS | identify.MODE_TAGS | identify.ENCODING_TAGS
-        )
 
     def format(self, filename: str, selections: Sequence[tuple[int, str]]) -> str:
         if selections and self._files_with_matches:
@@ -323,25 +780,101 @@ class SelectionFormatter:
         return selection[1]
 
 
+class SelectionFormatterMatchHighlight(SelectionFormatter):
+    def __init__(self, pattern: str, ignore_case: bool = False, **kwds: Any) -> None:
+        super().__init__(**kwds)
+        self._pattern = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+    def format_selection(self, selection: tuple[int, str]) -> str:
+        return self._pattern.sub(_highlight_match, selection[1])
+
+
+def _highlight_match(match: re.Match[str]) -> str:
+    return f"\x1b[1;31m{match[0]}\x1b[0m" if match[0] else ""
+
+
+_IGNORE_TAGS = identify.TYPE_TAGS | identify.MODE_TAGS | identify.ENCODING_TAGS
+
+
+@functools.lru_cache(maxsize=8192)
+def _tags_from_path(filename: str) -> frozenset[str]:
+    return frozenset(identify.tags_from_path(filename))
+
+
+@functools.lru_cache(maxsize=8192)
+def _tags_from_filename(basename: str) -> frozenset[str]:
+    return frozenset(identify.tags_from_filename(basename))
+
+
+def _tags_for(filename: str) -> frozenset[str]:
+    tags = _tags_from_filename(os.path.basename(filename))
+    if not tags & identify.ENCODING_TAGS:
+        tags = _tags_from_path(filename)
+    return tags
+
+
+@functools.lru_cache(maxsize=None)
+def _lexer_names_by_alias() -> dict[str, str]:
+    from pygments.lexers import get_all_lexers
+
+    names: dict[str, str] = {}
+    for name, aliases, *_ in get_all_lexers():
+        for alias in aliases:
+            names.setdefault(alias, name)
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def _pick_best_lexer(tags: frozenset[str]) -> type[Lexer] | None:
+    import pygments.lexers
+
+    names = _lexer_names_by_alias()
+    for tag in sorted(tags):
+        if tag in names and (lexer := pygments.lexers.find_lexer_class(names[tag])):
+            return lexer
+    return None
+
+
 class SelectionFormatterSyntaxHighlight(SelectionFormatter):
+    PRELOAD = ("pygments", "pygments.formatters", "pygments.lexers")
+
     def __init__(self, **kwargs: Any) -> None:
+        from pygments.formatters import TerminalTrueColorFormatter
+
         super().__init__(**kwargs)
-        self._lexer = TextLexer(ensurenl=False)
+        self._formatter = TerminalTrueColorFormatter()
+        self._lexers: dict[frozenset[str], Lexer | None] = {}
 
     def format(self, filename: str, selections: Sequence[tuple[int, str]]) -> str:
-        tags = identify.tags_from_path(filename) - self._ignore_tags
+        from pygments import highlight
 
+        if selections and self._files_with_matches:
+            return filename
+
+        tags = _tags_for(filename)
         try:
-            self._lexer = pygments.lexers.find_lexer_class_by_name(sorted(tags)[0])(
-                ensurenl=False
+            lexer = self._lexers[tags]
+        except KeyError:
+            lexer_class = _pick_best_lexer(tags - _IGNORE_TAGS)
+            lexer = self._lexers[tags] = (
+                None
+                if lexer_class is None
+                else lexer_class(ensurenl=False, stripnl=False)
             )
-        except IndexError:
-            self._lexer = TextLexer()
+        if lexer is None:
+            return super().format(filename, selections)
 
-        return super().format(filename, selections)
+        lines = [line for _, line in selections]
+        highlighted = highlight("\n".join(lines), lexer, self._formatter).split("\n")
+        if len(highlighted) != len(lines):
+            highlighted = [highlight(line, lexer, self._formatter) for line in lines]
 
-    def format_selection(self, selection: tuple[int, str]) -> str:
-        return highlight(selection[1], self._lexer, TerminalTrueColorFormatter())
+        return os.linesep.join(
+            [
+                self.format_prefix(filename, selection) + line
+                for selection, line in zip(selections, highlighted)
+            ]
+        )
 
 
 class CollectFiles:
@@ -353,18 +886,48 @@ class CollectFiles:
         types: Sequence[str] = ("python",),
         types_or: Sequence[str] | None = None,
     ) -> None:
-        self._include_pattern = re.compile(include)
-        self._exclude_pattern = re.compile(exclude)
+        self._include_search = (
+            None if include in (".*", "") else re.compile(include).search
+        )
+        self._exclude_search = None if exclude == "^$" else re.compile(exclude).search
         self._types = frozenset(types)
         self._types_or = frozenset(types_or if types_or is not None else ())
         self._base = base
+        self._needs_stat = bool(
+            (self._types | self._types_or) & (identify.TYPE_TAGS | identify.MODE_TAGS)
+        )
 
     def collect(self) -> Generator[str, None, None]:
         raise NotImplementedError("collect")
 
-    def filter_file_by_type(self, filename: str):
-        tags = identify.tags_from_path(filename)
-        return tags >= self._types and (not self._types_or or (tags & self._types_or))
+    def filter_file(self, filename: str, basename: str | None = None) -> bool:
+        return self.filter_file_by_name(filename) and self.filter_file_by_type(
+            filename, basename
+        )
+
+    def filter_file_by_name(self, filename: str) -> bool:
+        if self._include_search and not self._include_search(filename):
+            return False
+        return not (self._exclude_search and self._exclude_search(filename))
+
+    def filter_file_by_type(self, filename: str, basename: str | None = None) -> bool:
+        if self._needs_stat:
+            return self.filter_tags(_tags_from_path(filename))
+
+        tags = _tags_from_filename(basename or os.path.basename(filename))
+        if not tags & identify.ENCODING_TAGS:
+            # only read the file to tell text from binary if that could matter
+            if (tags or not os.access(filename, os.X_OK)) and not self.filter_tags(
+                tags | identify.ENCODING_TAGS
+            ):
+                return False
+            tags = _tags_from_path(filename)
+        return self.filter_tags(tags)
+
+    def filter_tags(self, tags: frozenset[str]) -> bool:
+        return tags >= self._types and (
+            not self._types_or or not tags.isdisjoint(self._types_or)
+        )
 
 
 class WalkFiles(CollectFiles):
@@ -376,6 +939,7 @@ class WalkFiles(CollectFiles):
         lib\.
     )
     """
+    _IGNORE_RE = re.compile(IGNORE_PATTERN)
 
     def __init__(
         self,
@@ -393,32 +957,54 @@ class WalkFiles(CollectFiles):
             types_or=types_or,
         )
 
-        self._ignore_pattern = re.compile(WalkFiles.IGNORE_PATTERN)
-
     @cached_property
     def top_level(self) -> str:
         return str(pathlib.Path(self._base))
 
     def collect(self) -> Generator[str, None, None]:
-        for filename in self.get_all_files():
-            if (
-                self._include_pattern.search(filename)
-                and not self._exclude_pattern.search(filename)
-                and self.filter_file_by_type(filename)
-            ):
-                yield filename
+        filter_file = self.filter_file
+        for path, name in self.get_all_entries():
+            if filter_file(path, name):
+                yield path
 
     def get_all_files(self) -> Generator[str, None, None]:
-        file_list = []
-        for root, dirs, files in pathlib.Path(self.top_level).walk():
-            for file_path in (root / f for f in files):
-                file_list.append(file_path)
-            dirs[:] = [d for d in dirs if not self.ignore_path(d)]
+        for path, _ in self.get_all_entries():
+            yield path
+
+    def get_all_entries(self) -> Generator[tuple[str, str], None, None]:
+        top_level = "" if self.top_level == os.curdir else self.top_level
 
-        return (str(f) for f in file_list)
+        stack = [top_level]
+        while stack:
+            files, dirs = self.scan_dir(stack.pop())
+            yield from files
+            stack += reversed(dirs)
+
+    def scan_dir(self, root: str) -> tuple[list[tuple[str, str]], list[str]]:
+        ignore = WalkFiles._IGNORE_RE.search
+        join = os.path.join
+
+        # unless filtering on file type or mode, only regular files can match
+        regular_only = not self._needs_stat
+
+        files, dirs = [], []
+        try:
+            with os.scandir(root or os.curdir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    path = join(root, name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if not ignore(name):
+                            dirs.append(path)
+                    elif not regular_only or entry.is_file(follow_symlinks=False):
+                        files.append((path, name))
+        except OSError:
+            # like os.walk, skip directories that can't be read
+            return [], []
+        return files, dirs
 
     def ignore_path(self, path) -> bool:
-        return bool(self._ignore_pattern.search(path))
+        return bool(WalkFiles._IGNORE_RE.search(path))
 
 
 class GitFiles(CollectFiles):
@@ -471,28 +1057,49 @@ class GitFiles(CollectFiles):
         )
 
     def get_all_files(self, relative: bool = False) -> Generator[str, None, None]:
-        output = subprocess.check_output(
-            ["git", "ls-files", "-z"], cwd=self.top_level
-        ).decode()
-
-        all_files = (filename for filename in output.split("\0"))
-
-        if relative:
+        prefix = b""
+        if relative and self.top_level != os.getcwd():
             path_to_top = pathlib.Path(self.top_level).relative_to(
                 pathlib.Path(".").absolute(), walk_up=True
             )
-
-            all_files = (str(path_to_top / path) for path in all_files)
-        return all_files
+            if path_to_top != pathlib.Path():
+                prefix = os.fsencode(path_to_top) + os.fsencode(os.sep)
+
+        # unless filtering on file type or mode, only regular files can match
+        regular_only = not self._needs_stat
+
+        previous = b""
+        for entry in self._ls_files():
+            meta, _, filename = entry.partition(b"\t")
+            if filename == previous:
+                # an unmerged file is listed once per stage
+                continue
+            previous = filename
+            if regular_only and meta.startswith((b"120000", b"160000")):
+                continue
+            yield os.fsdecode(prefix + filename)
+
+    def _ls_files(self) -> Generator[bytes, None, None]:
+        with subprocess.Popen(
+            ["git", "ls-files", "-z", "--stage"],
+            bufsize=0,
+            stdout=subprocess.PIPE,
+            cwd=self.top_level,
+        ) as process:
+            assert process.stdout is not None
+
+            remainder = b""
+            while chunk := process.stdout.read(65536):
+                *entries, remainder = (remainder + chunk).split(b"\0")
+                yield from filter(None, entries)
+            if remainder:
+                yield remainder
+
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
 
     def collect(self) -> Generator[str, None, None]:
-        for filename in self.get_all_files(relative=True):
-            if (
-                self._include_pattern.search(filename)
-                and not self._exclude_pattern.search(filename)
-                and self.filter_file_by_type(filename)
-            ):
-                yield filename
+        yield from filter(self.filter_file, self.get_all_files(relative=True))
 
 
 if __name__ == "__main__":
@@ -75,3 +75,83 @@ def test_walk_files(git_dir, file_type, expected):
             pathlib.Path(f)
             for f in sorted(egret.WalkFiles(types_or=(file_type,)).collect())
         ] == [pathlib.Path(f) for f in expected]
+
+
+def test_walk_files_nested(tmp_path):
+    expected = []
+    for depth in range(5):
+        for n in range(3):
+            path = tmp_path.joinpath(*[f"dir{d}" for d in range(depth)], f"{n}.py")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("")
+            expected.append(path)
+    for name in "bcad":
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "foo.py").write_text("")
+        expected.append(tmp_path / name / "foo.py")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "foo.py").write_text("")
+
+    files = [pathlib.Path(f) for f in egret.WalkFiles(tmp_path).get_all_files()]
+    assert sorted(files) == sorted(expected)
+
+    walked = []
+    for root, dirs, filenames in tmp_path.walk():
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        walked += [root / filename for filename in filenames]
+    assert files == walked
+
+
+@pytest.mark.parametrize("types", (("text",), ("symlink",)))
+def test_walk_files_skips_special_files(tmp_path, types):
+    (tmp_path / "foo.py").write_text("")
+    (tmp_path / "bar.py").symlink_to(tmp_path / "foo.py")
+    os.mkfifo(tmp_path / "baz.py")
+
+    collector = egret.WalkFiles(tmp_path, types=types, types_or=())
+    if "symlink" in types:
+        expected = ["bar.py"]
+    else:
+        expected = ["foo.py"]
+    assert [pathlib.Path(f).name for f in collector.collect()] == expected
+
+
+@pytest.mark.parametrize(
+    "types,types_or,expected",
+    (
+        (("text",), ("python",), ["real.py"]),
+        (("symlink",), (), ["dangling.py", "link.py"]),
+    ),
+)
+def test_git_files_skips_symlinks(tmp_path, types, types_or, expected):
+    subprocess.check_output(["git", "init", str(tmp_path)])
+    with as_cwd(tmp_path):
+        pathlib.Path("real.py").write_text("import os")
+        pathlib.Path("link.py").symlink_to("real.py")
+        pathlib.Path("dangling.py").symlink_to("missing.py")
+        subprocess.check_output(["git", "add", "real.py", "link.py", "dangling.py"])
+
+        collector = egret.GitFiles(types=types, types_or=types_or)
+        assert sorted(collector.collect()) == expected
+
+
+def test_walk_files_skips_unreadable_dirs(tmp_path, monkeypatch):
+    (tmp_path / "foo.py").write_text("")
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked" / "bar.py").write_text("")
+
+    scandir = os.scandir
+
+    def locked_scandir(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", locked_scandir)
+    assert [
+        pathlib.Path(f).name for f in egret.WalkFiles(tmp_path).get_all_files()
+    ] == ["foo.py"]
+
+
+def test_walk_files_missing_dir(tmp_path):
+    assert list(egret.WalkFiles(tmp_path / "missing").get_all_files()) == []
@@ -6,6 +6,13 @@ import pytest
 import egret
 
 
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    egret._find_user_config_file.cache_clear()
+    yield
+    egret._find_user_config_file.cache_clear()
+
+
 def test_find_config_file(monkeypatch):
     if sys.platform == "win32":
         path_to_config = egret.find_user_config_file()
@@ -55,3 +62,43 @@ def test_parse_config_empty_contents(tmpdir, contents):
 @pytest.mark.parametrize("arg", (None, "/not/a/file.toml"))
 def test_parse_config_empty(arg):
     assert egret.parse_config_toml(arg) == {}
+
+
+def test_parse_config_reloads_when_changed(tmpdir):
+    with tmpdir.as_cwd():
+        with open("egret.toml", "w") as fp:
+            print("[tool.egret]\ntypes = ['ini']", file=fp)
+        assert egret.parse_config_toml("egret.toml") == {"types": ["ini"]}
+
+        with open("egret.toml", "w") as fp:
+            print("[tool.egret]\ntypes = ['toml', 'ini']", file=fp)
+        assert egret.parse_config_toml("egret.toml") == {"types": ["toml", "ini"]}
+
+
+def test_parse_config_without_rtoml(tmpdir, monkeypatch):
+    pytest.importorskip("rtoml")
+
+    with tmpdir.as_cwd():
+        with open("egret.toml", "w") as fp:
+            print("[tool.egret]\nextend-types = ['ini']\njobs = 2", file=fp)
+        egret._load_config_toml.cache_clear()
+        expected = egret.parse_config_toml("egret.toml")
+
+        monkeypatch.setattr(egret, "rtoml", None)
+        egret._load_config_toml.cache_clear()
+        assert egret.parse_config_toml("egret.toml") == expected
+
+
+def test_find_config_file_follows_environment(monkeypatch):
+    if sys.platform == "win32":
+        pytest.skip("XDG_CONFIG_HOME is not used on Windows")
+
+    monkeypatch.setenv("XDG_CONFIG_HOME", "/not/a/real/dir")
+    assert egret.find_user_config_file() == "/not/a/real/dir/egret.toml"
+
+    monkeypatch.setenv("XDG_CONFIG_HOME", "/another/dir")
+    assert egret.find_user_config_file() == "/another/dir/egret.toml"
+
+    monkeypatch.delenv("XDG_CONFIG_HOME")
+    monkeypatch.setenv("HOME", "/home/egret")
+    assert egret.find_user_config_file() == "/home/egret/.config/egret.toml"
@@ -0,0 +1,87 @@
+import re
+
+import pytest
+
+import egret
+
+
+@pytest.mark.parametrize(
+    "Formatter", (egret.SelectionFormatter, egret.SelectionFormatterSyntaxHighlight)
+)
+def test_format_one_line_per_selection(tmpdir, Formatter):
+    selections = [(0, "import os"), (1, ""), (4, "def foo(): pass")]
+    with tmpdir.as_cwd():
+        with open("foo.py", "w") as fp:
+            fp.write("")
+        formatted = Formatter(with_line_numbers=True).format("foo.py", selections)
+
+    lines = formatted.splitlines()
+    assert len(lines) == len(selections)
+    assert [line.split(":", 2)[1] for line in lines] == ["0", "1", "4"]
+
+
+@pytest.mark.parametrize(
+    "Formatter", (egret.SelectionFormatter, egret.SelectionFormatterSyntaxHighlight)
+)
+def test_format_files_with_matches(Formatter):
+    formatter = Formatter(files_with_matches=True)
+    assert formatter.format("foo.py", [(0, "import os")]) == "foo.py"
+
+
+def test_highlight_adds_color(tmpdir):
+    with tmpdir.as_cwd():
+        with open("foo.py", "w") as fp:
+            fp.write("")
+        formatted = egret.SelectionFormatterSyntaxHighlight(
+            with_line_numbers=False
+        ).format("foo.py", [(0, "import os")])
+
+    assert formatted.startswith("foo.py:")
+    assert "\x1b[" in formatted
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    (
+        ("os", "import \x1b[1;31mos\x1b[0m, p\x1b[1;31mos\x1b[0mix"),
+        ("^", "import os, posix"),
+        ("OS", "import os, posix"),
+    ),
+)
+def test_highlight_match(pattern, expected):
+    formatted = egret.SelectionFormatterMatchHighlight(
+        pattern, with_line_numbers=False
+    ).format("foo.py", [(0, "import os, posix")])
+    assert formatted == "foo.py:" + expected
+
+
+def test_highlight_match_ignore_case():
+    formatted = egret.SelectionFormatterMatchHighlight(
+        "OS", ignore_case=True, with_line_numbers=False
+    ).format("foo.py", [(0, "import os")])
+    assert formatted == "foo.py:import \x1b[1;31mos\x1b[0m"
+
+
+def test_highlight_resets_color_at_end_of_each_line(tmpdir):
+    selections = [(0, 'x = """abc'), (1, 'def"""'), (2, "print(1)")]
+    with tmpdir.as_cwd():
+        with open("foo.py", "w") as fp:
+            fp.write("")
+        formatted = egret.SelectionFormatterSyntaxHighlight(
+            with_line_numbers=False
+        ).format("foo.py", selections)
+
+    for line in formatted.splitlines():
+        last_code = re.findall(r"\x1b\[([\d;]*)m", line)[-1]
+        assert last_code.split(";")[-1] in ("0", "00", "39")
+
+
+def test_highlight_unknown_file_type_is_plain(tmpdir):
+    with tmpdir.as_cwd():
+        with open("foo.unknown", "w") as fp:
+            fp.write("import os\n")
+        formatted = egret.SelectionFormatterSyntaxHighlight(
+            with_line_numbers=False
+        ).format("foo.unknown", [(0, "import os")])
+
+    assert formatted == "foo.unknown:import os"
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+import egret
+
+
+@pytest.fixture
+def process_files():
+    return egret.ProcessFiles(
+        egret.LineSelector("import").select_from_path,
+        egret.SelectionFormatter(with_line_numbers=True).format,
+        workers=2,
+    )
+
+
+@pytest.mark.parametrize("n_files", (10, 2 * egret.ProcessFiles.SERIAL_THRESHOLD))
+def test_process_files_streams_matches_in_order(tmpdir, process_files, n_files):
+    with tmpdir.as_cwd():
+        for n in range(n_files):
+            with open(f"foo{n}.py", "w") as fp:
+                fp.write(("import os\n" * 1000 * (1 + n % 3)) if n % 2 else "pass\n")
+        with process_files:
+            results = list(process_files(f"foo{n}.py" for n in range(n_files)))
+
+    assert [result.split(b":", 1)[0] for result in results] == [
+        f"foo{n}.py".encode() for n in range(1, n_files, 2)
+    ]
+
+
+@pytest.mark.parametrize("n_files", (1, 2 * egret.ProcessFiles.SERIAL_THRESHOLD))
+def test_process_files_without_context(tmpdir, process_files, n_files):
+    with tmpdir.as_cwd():
+        for n in range(n_files):
+            with open(f"foo{n}.py", "w") as fp:
+                fp.write("import os\n")
+        results = list(process_files([f"foo{n}.py" for n in range(n_files)]))
+
+    assert len(results) == n_files
+    assert process_files._pool is None
+
+
+def test_process_files_serial_skips_pool(tmpdir, process_files):
+    with tmpdir.as_cwd():
+        with open("foo.py", "w") as fp:
+            fp.write("import os\n")
+        with process_files:
+            assert list(process_files(["foo.py"])) == [b"foo.py:0:import os"]
+            assert process_files._pool is None
+
+
+@pytest.mark.parametrize("workers", (1, 2))
+def test_process_files_is_lazy(tmpdir, workers):
+    process_files = egret.ProcessFiles(
+        egret.LineSelector("import").select_from_path,
+        egret.SelectionFormatter(with_line_numbers=False).format,
+        workers=workers,
+    )
+    released = threading.Event()
+    timed_out = []
+
+    names = [f"foo{n}.py" for n in range(2 * egret.ProcessFiles.SERIAL_THRESHOLD)]
+
+    def files():
+        yield from names
+        timed_out.append(not released.wait(timeout=5))
+        yield "bar.py"
+
+    with tmpdir.as_cwd():
+        for name in names + ["bar.py"]:
+            with open(name, "w") as fp:
+                fp.write("import os\n")
+        with process_files:
+            results = process_files(files())
+            assert next(results) == b"foo0.py:import os"
+            released.set()
+            assert list(results)[-1] == b"bar.py:import os"
+
+    assert timed_out == [False]
+
+
+def test_process_files_unable_to_process(tmpdir, capsys, process_files):
+    with tmpdir.as_cwd():
+        with open("foo.py", "w") as fp:
+            fp.write("import os\n")
+        results = list(process_files(["missing.py", "foo.py"]))
+
+    assert results == [b"foo.py:0:import os"]
+    assert capsys.readouterr().err.startswith("unable to process missing.py")
@@ -0,0 +1,259 @@
+import io
+import re
+
+import pytest
+
+import egret
+
+LINES = b"""\
+import os
+import sys
+
+def foo():
+    return os.getcwd()
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_selector_cache():
+    egret.LineSelector.cache_clear()
+    yield
+    egret.LineSelector.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    (
+        ("import", [(0, "import os"), (1, "import sys")]),
+        ("^def", [(3, "def foo():")]),
+        ("os\\.", [(4, "    return os.getcwd()")]),
+        ("sys$", [(1, "import sys")]),
+        ("os\\s+import", []),
+        ("bar", []),
+    ),
+)
+def test_select_lines(pattern, expected):
+    selector = egret.LineSelector(pattern)
+    assert selector.select_from_filelike(io.BytesIO(LINES)) == expected
+
+
+def test_select_lines_max_count():
+    selector = egret.LineSelector("import", max_count=1)
+    assert selector.select_from_filelike(io.BytesIO(LINES)) == [(0, "import os")]
+
+
+def test_select_lines_invert_match():
+    selector = egret.LineSelector("o", invert_match=True)
+    assert selector.select_from_filelike(io.BytesIO(LINES)) == [(2, "")]
+
+
+@pytest.mark.parametrize("invert_match", (False, True))
+def test_select_lines_ignore_case(invert_match):
+    selector = egret.LineSelector("IMPORT", ignore_case=True, invert_match=invert_match)
+    selected = selector.select_from_filelike(io.BytesIO(LINES))
+    if invert_match:
+        assert [lineno for lineno, _ in selected] == [2, 3, 4]
+    else:
+        assert selected == [(0, "import os"), (1, "import sys")]
+
+
+@pytest.mark.parametrize("invert_match", (False, True))
+def test_match_line(invert_match):
+    selector = egret.LineSelector("foo", invert_match=invert_match)
+    assert selector.match_line(b"foobar") is not invert_match
+    assert selector.match_line(b"bar") is invert_match
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    (
+        ("=", [(0, "café = 1"), (1, "bad = b'�'")]),
+        ("1$", [(0, "café = 1")]),
+        ("= \\d$", [(0, "café = 1")]),
+        ("'$", [(1, "bad = b'�'")]),
+        ("\\s$", []),
+    ),
+)
+def test_select_from_path(tmpdir, pattern, expected):
+    with tmpdir.as_cwd():
+        with open("foo.py", "wb") as fp:
+            fp.write(b"caf\xc3\xa9 = 1\r\nbad = b'\xff'\r\n")
+        selected = egret.LineSelector(pattern).select_from_path("foo.py")
+
+    assert selected == expected
+
+
+@pytest.mark.parametrize("invert_match", (False, True))
+def test_select_strips_one_carriage_return(invert_match):
+    selected = egret.LineSelector(
+        "foo" if not invert_match else "bar", invert_match=invert_match
+    ).select_from_filelike(io.BytesIO(b"foo\r\r\nfoo\r\n"))
+    assert selected == [(0, "foo\r"), (1, "foo")]
+
+
+@pytest.mark.parametrize("ignore_case", (False, True))
+@pytest.mark.parametrize(
+    "pattern",
+    (
+        "import",
+        "^def",
+        "os\\.",
+        "^$",
+        "IMPORT",
+        "(o)\\1",
+        "s(?=\\.)",
+        "a{,2}",
+        "z{,2}q",
+        "b'.*'",
+    ),
+)
+def test_select_lines_with_re2(monkeypatch, pattern, ignore_case):
+    pytest.importorskip("re2")
+
+    lines = LINES + "bad = b'\xff'\nq\nÉcole\n".encode("latin-1")
+    selector = egret.LineSelector(pattern, ignore_case=ignore_case)
+    expected = selector.select_from_filelike(io.BytesIO(lines))
+    with monkeypatch.context() as mp:
+        mp.setattr(egret, "re2", None)
+        egret.LineSelector.cache_clear()
+        assert (
+            egret.LineSelector(pattern, ignore_case=ignore_case).select_from_filelike(
+                io.BytesIO(lines)
+            )
+            == expected
+        )
+
+
+@pytest.mark.parametrize("invert_match", (False, True))
+@pytest.mark.parametrize("pattern", ("import", "^def", "^$", "bar"))
+def test_select_from_mapped_file(tmpdir, monkeypatch, pattern, invert_match):
+    selector = egret.LineSelector(pattern, invert_match=invert_match)
+    with tmpdir.as_cwd():
+        with open("foo.py", "wb") as fp:
+            fp.write(LINES * 3)
+        expected = selector.select_from_path("foo.py")
+
+        monkeypatch.setattr(egret.LineSelector, "MMAP_THRESHOLD", 0)
+        monkeypatch.setattr(egret._MappedFile, "CHUNK_SIZE", 7)
+        assert selector.select_from_path("foo.py") == expected
+
+
+@pytest.mark.parametrize("max_count", (-1, 1, 3))
+@pytest.mark.parametrize("invert_match", (False, True))
+@pytest.mark.parametrize("pattern", ("import", "^def", "^$", "o"))
+def test_select_from_filelike_in_chunks(pattern, invert_match, max_count):
+    selector = egret.LineSelector(
+        pattern, max_count=max_count, invert_match=invert_match, buffer_size=5
+    )
+    expected = selector.select_from_buffer(LINES * 3)
+    assert selector.select_from_filelike(io.BytesIO(LINES * 3)) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,folded",
+    (("IMPORT", True), ("Os.getcwd", False), ("İmport", False), ("ımport", False)),
+)
+def test_select_ignore_case_with_folded_pattern(pattern, folded):
+    selector = egret.LineSelector(pattern, ignore_case=True)
+    assert (selector._folded_regex is not None) is folded
+
+    # an ASCII pattern only folds ASCII case
+    flags = re.IGNORECASE | (re.ASCII if pattern.isascii() else 0)
+    lines = LINES + "İMPORT ıMPORT\n".encode()
+    expected = [
+        (lineno, line.decode())
+        for lineno, line in enumerate(lines.splitlines())
+        if re.search(pattern, line.decode(), flags)
+    ]
+    assert selector.select_from_buffer(lines) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,required",
+    (
+        (".*getcwd.*", b"getcwd"),
+        ("\\w+\\.getcwd", b".getcwd"),
+        ("(?:s|os)\\.get", b".get"),
+        ("import", b""),
+        ("(?i)\\w+OS", b""),
+    ),
+)
+def test_select_lines_with_required_literal(pattern, required):
+    selector = egret.LineSelector(pattern)
+    assert selector._required == required
+
+    expected = [
+        (lineno, line.decode())
+        for lineno, line in enumerate(LINES.splitlines())
+        if re.search(pattern.encode(), line)
+    ]
+    assert selector.select_from_buffer(LINES * 2)[: len(expected)] == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    (
+        ("caf\\u00e9", [(0, "café = 1")]),
+        ("caf\\w", [(0, "café = 1")]),
+        ("\\bna\\w+ve\\b", [(1, "naïve = 2")]),
+        ("a.b", [(2, "aéb = 3")]),
+        ("\\d = \\d", []),
+        ("(?a)caf\\w", []),
+        ("é.*=", [(0, "café = 1"), (2, "aéb = 3")]),
+        (".+.+", [(0, "café = 1"), (1, "naïve = 2"), (2, "aéb = 3")]),
+        ("[^a]+[^b]+", [(0, "café = 1"), (1, "naïve = 2"), (2, "aéb = 3")]),
+        (".+x?.+", [(0, "café = 1"), (1, "naïve = 2"), (2, "aéb = 3")]),
+        (".+=.+", [(0, "café = 1"), (1, "naïve = 2"), (2, "aéb = 3")]),
+    ),
+)
+def test_select_lines_as_text(pattern, expected):
+    lines = "café = 1\nnaïve = 2\naéb = 3\né\n".encode()
+    assert egret.LineSelector(pattern).select_from_buffer(lines) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,as_bytes",
+    (
+        ("import", True),
+        ("^def .*:$", True),
+        ("[a-z]+[^x]*", True),
+        (".+=.+", True),
+        (".+.+", False),
+        ("(.+)", False),
+        ("\\w", False),
+        ("\\bfoo", False),
+        ("a.b", False),
+        ("[^a]{2,}", False),
+        ("é", False),
+    ),
+)
+def test_select_lines_as_bytes(pattern, as_bytes):
+    assert (egret.LineSelector(pattern)._text_pattern is None) is as_bytes
+
+
+def test_select_lines_bad_pattern():
+    with pytest.raises(re.error):
+        egret.LineSelector("foo(")
+
+
+@pytest.mark.parametrize(
+    "pattern,expected",
+    (
+        ("\\Adef", [(3, "def foo():")]),
+        ("sys\\Z", [(1, "import sys")]),
+        ("\\A\\Z", [(2, "")]),
+    ),
+)
+def test_select_lines_string_anchors_match_each_line(pattern, expected):
+    assert egret.LineSelector(pattern).select_from_buffer(LINES) == expected
+
+
+@pytest.mark.parametrize(
+    "pattern,buffer,expected",
+    (
+        ("(a|bo)$", b"def foo():\n    return a\n", [(1, "    return a")]),
+        ("^ *$", b"abcdefgh\nabcdef\nabcdefg\n\n", [(3, "")]),
+    ),
+)
+def test_select_lines_end_of_line_anchors(pattern, buffer, expected):
+    assert egret.LineSelector(pattern).select_from_buffer(buffer) == expected